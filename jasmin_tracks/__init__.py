@@ -1,4 +1,6 @@
 from string import Formatter
+import gzip
+import os
 import re
 import pathlib
 
@@ -6,8 +8,12 @@ from parse import parse
 
 # Paths to data on JASMIN
 # From https://research.reading.ac.uk/huracan/science/data/
+# Can be overridden with $HURACAN_PROJECT_PATH, e.g. to test on a local copy
 huracan_project_path = pathlib.Path(
-    "/gws/ssde/j25b/huracan/data/tracks/tropical_cyclones/TRACK/"
+    os.environ.get(
+        "HURACAN_PROJECT_PATH",
+        "/gws/ssde/j25b/huracan/data/tracks/tropical_cyclones/TRACK/",
+    )
 )
 
 # Shorthands for defining paths for each dataset
@@ -18,10 +24,33 @@ _YYYYMMDDHH_model_leap = _YYYYMMDDHH.replace("year", "model_year").replace(
 )
 
 
-def summary():
+def summary(inventory=False, **kwargs):
+    """Print the template and keys for each dataset
+
+    If inventory=True, also print the number of files, their total size and the
+    values of each key, from jasmin_tracks.inventory.get_inventory. This scans every
+    dataset, unless it is already cached. Keywords are passed to get_inventory
+    """
+    if inventory:
+        from .inventory import get_inventory
+
     for dataset in datasets:
         print(dataset)
-        print(datasets[dataset], "\n")
+        if inventory and isinstance(datasets[dataset], TrackDataset):
+            print(datasets[dataset])
+            details = get_inventory(dataset, **kwargs)
+            print(
+                f"{details['n_files']} files, "
+                f"{details['total_bytes'] / 1e9:.2f} GB"
+            )
+            for key in ["n_tracks", "n_records"]:
+                if key in details:
+                    print(f"{key}: {details[key]}")
+            for key, values in details["values"].items():
+                print(f"{key}: {values}")
+            print()
+        else:
+            print(datasets[dataset], "\n")
 
 
 def _get_keyword_from_string(format_string):
@@ -55,6 +84,33 @@ def _format_string_by_keyword_subset(format_string, keywords):
     return format_string.format(**kw_matching)
 
 
+def read_track_counts(filename, records=True):
+    """Count the tracks and records in a TRACK ASCII file without loading it
+
+    The number of tracks is read from the header. Counting the records requires
+    reading the POINT_NUM line of every track, so set records=False to stop after the
+    header. Returns (n_tracks, n_records) or (None, None) for netCDF files
+    """
+    filename = str(filename)
+    if filename.endswith(".nc"):
+        return None, None
+
+    opener = gzip.open if filename.endswith(".gz") else open
+
+    n_tracks, n_records = None, None
+    with opener(filename, "rt") as f:
+        for line in f:
+            if line.startswith("TRACK_NUM"):
+                n_tracks = int(line.split()[1])
+                if not records:
+                    break
+                n_records = 0
+            elif line.startswith("POINT_NUM"):
+                n_records += int(line.split()[1])
+
+    return n_tracks, n_records
+
+
 class TrackDataset:
     def __init__(
         self, fixed_path, extra_path, filename, variable_names=None, alternatives=None
@@ -1,3 +1,10 @@
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import os
+import pathlib
+import shutil
+import tempfile
+import threading
 import warnings
 
 from parse import parse
@@ -16,8 +23,15 @@ def get_tracks(
     start_time=None,
     end_time=None,
     mask_value=None,
+    prefetch=0,
+    prefetch_bytes=None,
     **kwargs,
 ):
+    """Load all the tracks in a dataset matching the keywords into a single dataset
+
+    Set prefetch to copy the next files in background threads while the current file
+    is being loaded (see prefetch_files)
+    """
     dataset = datasets[dataset_name]
     if alternative is not None:
         dataset = dataset.select_alternative(alternative)
@@ -25,27 +39,176 @@ def get_tracks(
     all_files = sorted(dataset.find_files(**kwargs))
 
     all_tracks = []
-    for n, fname in tqdm(enumerate(all_files), total=len(all_files)):
-        tracks = huracanpy.load(
-            str(fname), source="TRACK", variable_names=dataset.variable_names
-        )
+    for fname, local_copy in tqdm(
+        prefetch_files(all_files, prefetch=prefetch, max_bytes=prefetch_bytes),
+        total=len(all_files),
+    ):
+        tracks = load_file(dataset, fname, exclude=kwargs, local_copy=local_copy)
+        if tracks is not None:
+            all_tracks.append(tracks)
+
+    return combine_tracks(
+        all_tracks,
+        drop=drop,
+        reduce_precision=reduce_precision,
+        start_time=start_time,
+        end_time=end_time,
+        mask_value=mask_value,
+    )
+
+
+def prefetch_files(files, prefetch=4, max_bytes=None):
+    """Iterate over (filename, local_copy) where local_copy is a copy of the file in a
+    temporary directory, made in background threads up to prefetch files ahead
+
+    This lets the next prefetch files be copied from a slow filesystem while the
+    current file is being processed. The copy is removed when the next file is
+    requested. If max_bytes is given, the total size of the copies (including the
+    current file) is kept below max_bytes, but there is always at least one. Only
+    threads are used, so this works where a process pool isn't allowed. If prefetch is
+    0, the files aren't copied and local_copy is None
+    """
+    if prefetch < 1:
+        for fname in files:
+            yield fname, None
+        return
+
+    files = list(files)
+    budget = _PrefetchBudget(max_bytes)
+    pending = deque()
+    with tempfile.TemporaryDirectory() as tmpdir, ThreadPoolExecutor(
+        max_workers=prefetch
+    ) as executor:
+
+        def submit(n):
+            local_copy = pathlib.Path(tmpdir) / str(n) / pathlib.Path(files[n]).name
+            future = executor.submit(_copy_file, files[n], local_copy, n, budget)
+            pending.append((files[n], local_copy, future))
 
-        # Add specific details from files
         try:
-            details = dataset.file_details(fname)
-            for key in details:
-                if key not in kwargs:
-                    if key in tracks:
-                        raise ValueError(
-                            f"Need to add {key} to tracks but it already exists"
-                        )
+            for n in range(min(prefetch, len(files))):
+                submit(n)
 
-                    tracks[key] = ("record", [details[key]] * len(tracks.time))
+            for n in range(len(files)):
+                fname, local_copy, future = pending.popleft()
+                size = future.result()
+
+                # Start copying the next file before handing over this one, so there
+                # are always prefetch files being copied while this one is processed
+                if n + prefetch < len(files):
+                    submit(n + prefetch)
+
+                yield fname, str(local_copy)
+
+                local_copy.unlink()
+                budget.release(size)
+        finally:
+            # Stop any copies waiting for space so the threads can finish
+            budget.close()
+
+
+def _copy_file(fname, local_copy, n, budget):
+    # Runs in a worker thread, so the metadata call to the (slow) filesystem isn't on
+    # the main thread either
+    size = 0
+    try:
+        size = os.path.getsize(fname)
+    finally:
+        # Always take a turn, even on failure, so the later files aren't blocked
+        budget.reserve(n, size)
+
+    local_copy.parent.mkdir()
+    shutil.copyfile(fname, local_copy)
+
+    return size
+
+
+class _PrefetchBudget:
+    """Limit the total size of the files copied by prefetch_files
+
+    Space is reserved in the same order the files are used, so a later file can't
+    take the space needed for the file currently being waited on
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.used = 0
+        self.next_file = 0
+        self.closed = False
+        self.condition = threading.Condition()
+
+    def _has_space(self, n, size):
+        if self.next_file != n:
+            return False
+        if self.max_bytes is None or self.used == 0:
+            return True
+        return self.used + size <= self.max_bytes
+
+    def reserve(self, n, size):
+        with self.condition:
+            self.condition.wait_for(lambda: self.closed or self._has_space(n, size))
+            if self.closed:
+                raise RuntimeError("Prefetching stopped")
+            self.used += size
+            self.next_file += 1
+            self.condition.notify_all()
+
+    def release(self, size):
+        with self.condition:
+            self.used -= size
+            self.condition.notify_all()
+
+    def close(self):
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
 
-            all_tracks.append(tracks)
-        except AttributeError as e:
-            warnings.warn(f"Failed to get details from file {fname}\n" + str(e) + "\n")
 
+def load_file(dataset, fname, exclude=(), local_copy=None):
+    """Load the tracks from a single file of a dataset and add the details from the
+    filename as extra variables (except for those in exclude)
+
+    If local_copy is given (e.g. from prefetch_files), the tracks are loaded from it
+    instead of fname. Returns None, with a warning, if the details can't be parsed
+    from the filename
+    """
+    tracks = huracanpy.load(
+        str(fname if local_copy is None else local_copy),
+        source="TRACK",
+        variable_names=dataset.variable_names,
+    )
+    if local_copy is not None:
+        # Make sure nothing is left to be read lazily before the copy is removed
+        tracks = tracks.load()
+
+    # Add specific details from files
+    try:
+        details = dataset.file_details(fname)
+    except AttributeError as e:
+        warnings.warn(f"Failed to get details from file {fname}\n" + str(e) + "\n")
+        return None
+
+    for key in details:
+        if key not in exclude:
+            if key in tracks:
+                raise ValueError(f"Need to add {key} to tracks but it already exists")
+
+            tracks[key] = ("record", [details[key]] * len(tracks.time))
+
+    return tracks
+
+
+def combine_tracks(
+    all_tracks,
+    drop=None,
+    reduce_precision=False,
+    start_time=None,
+    end_time=None,
+    mask_value=None,
+):
+    """Concatenate the tracks loaded from individual files and apply the
+    post-processing options of get_tracks
+    """
     all_tracks = huracanpy.concat_tracks(all_tracks, keep_track_id=True)
     all_tracks = gather_vorticity_profile(all_tracks)
 
@@ -55,22 +218,31 @@ def get_tracks(
     if reduce_precision:
         drop_precision(all_tracks)
 
-    if start_time is not None:
-        genesis = all_tracks.hrcn.get_gen_vals()
-        track_ids = genesis.track_id[genesis.time >= start_time]
-        all_tracks = all_tracks.hrcn.sel_id(track_ids)
-
-    if end_time is not None:
-        lysis = all_tracks.hrcn.get_apex_vals("time")
-        track_ids = lysis.track_id[lysis.time < end_time]
-        all_tracks = all_tracks.hrcn.sel_id(track_ids)
+    all_tracks = select_time_range(all_tracks, start_time, end_time)
 
     if mask_value is not None:
-        mask_values(tracks, mask_value)
+        mask_values(all_tracks, mask_value)
 
     return all_tracks
 
 
+def select_time_range(tracks, start_time=None, end_time=None):
+    """Only keep tracks starting at or after start_time and ending before end_time"""
+    # Convert to numpy because a datetime can't be compared with nanosecond times,
+    # which tracks loaded from netCDF have
+    if start_time is not None:
+        genesis = tracks.hrcn.get_gen_vals()
+        track_ids = genesis.track_id[genesis.time >= np.datetime64(start_time)]
+        tracks = tracks.hrcn.sel_id(track_ids)
+
+    if end_time is not None:
+        lysis = tracks.hrcn.get_apex_vals("time")
+        track_ids = lysis.track_id[lysis.time < np.datetime64(end_time)]
+        tracks = tracks.hrcn.sel_id(track_ids)
+
+    return tracks
+
+
 def gather_vorticity_profile(tracks):
     """Replace variables named vorticity_{n}hPa with a single variable and a pressure
     coordinate
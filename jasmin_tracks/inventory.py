@@ -0,0 +1,173 @@
+"""Summarise what files are in each dataset
+
+The inventory of a dataset gives the number of files, their total size and the values
+of each key that actually exist, and optionally the number of tracks and records.
+Directories are listed with a pool of threads, because most of the time is spent
+waiting on the filesystem, and the results are cached as JSON so they can be reused
+without scanning the dataset again. For example
+
+    inventory = get_inventory("ECMWF_hindcasts", model_year=2023)
+    inventory["values"]["ensemble_member"]
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+import datetime
+import itertools
+import json
+import os
+import pathlib
+
+from . import (
+    datasets,
+    read_track_counts,
+    TrackDataset,
+    _format_string_by_keyword_subset,
+)
+
+default_cache_dir = pathlib.Path(
+    os.environ.get(
+        "JASMIN_TRACKS_CACHE", pathlib.Path.home() / ".cache" / "jasmin_tracks"
+    )
+)
+
+
+def get_inventory(
+    dataset_name,
+    alternative=None,
+    count_tracks=False,
+    count_records=False,
+    max_workers=16,
+    refresh=False,
+    cache_dir=default_cache_dir,
+    **kwargs,
+):
+    """Scan the files in a dataset, matching any keywords as in find_files
+
+    Returns a dictionary with the number of files, total size in bytes and the sorted
+    unique values of each key. The number of tracks (read from the file headers) and
+    records (read from every track, so slower) are added if requested, or None for
+    netCDF files. Counting records also gives the number of tracks. The result is
+    loaded from cache_dir if it has already been calculated, unless refresh=True. Set
+    cache_dir=None to disable the cache
+    """
+    cache_file = None
+    if cache_dir is not None:
+        cache_file = pathlib.Path(cache_dir) / _cache_filename(
+            dataset_name, alternative, kwargs
+        )
+
+        if cache_file.exists() and not refresh:
+            with open(cache_file) as f:
+                inventory = json.load(f)
+
+            # Only use the cached inventory if it has the counts needed
+            if (not count_tracks or "n_tracks" in inventory) and (
+                not count_records or "n_records" in inventory
+            ):
+                return inventory
+
+    dataset = datasets[dataset_name]
+    if alternative is not None:
+        dataset = dataset.select_alternative(alternative)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        files = sorted(find_files_concurrent(dataset, executor, **kwargs))
+        sizes = list(executor.map(os.path.getsize, files))
+
+        if count_tracks or count_records:
+            counts = list(
+                executor.map(
+                    lambda fname: read_track_counts(fname, records=count_records),
+                    files,
+                )
+            )
+
+    values = {key: set() for key in dataset.keys}
+    for fname in files:
+        try:
+            details = dataset.file_details(fname)
+        except AttributeError:
+            # Filename doesn't match the template
+            continue
+        for key in details:
+            values[key].add(details[key])
+
+    inventory = dict(
+        dataset=dataset_name,
+        alternative=alternative,
+        filters=kwargs,
+        scanned=datetime.datetime.now().isoformat(timespec="seconds"),
+        n_files=len(files),
+        total_bytes=sum(sizes),
+        values={key: _sort_values(values[key]) for key in values},
+    )
+
+    # The number of tracks is read from the header whenever the files are counted
+    if count_tracks or count_records:
+        inventory["n_tracks"] = _sum_counts([c[0] for c in counts])
+    if count_records:
+        inventory["n_records"] = _sum_counts([c[1] for c in counts])
+
+    if cache_file is not None:
+        cache_file.parent.mkdir(parents=True, exist_ok=True)
+        with open(cache_file, "w") as f:
+            json.dump(inventory, f, indent=2)
+
+    return inventory
+
+
+def get_all_inventories(**kwargs):
+    """Run get_inventory for every dataset that has a template defined
+
+    Keywords are passed to get_inventory. Returns a dictionary of inventories with the
+    dataset names as keys
+    """
+    return {
+        name: get_inventory(name, **kwargs)
+        for name, dataset in datasets.items()
+        if isinstance(dataset, TrackDataset)
+    }
+
+
+def find_files_concurrent(dataset, executor, **kwargs):
+    """Equivalent to dataset.find_files, but listing the directories at each level of
+    the path in parallel using executor
+    """
+    extra_path = _format_string_by_keyword_subset(dataset.extra_path, kwargs)
+    filename = _format_string_by_keyword_subset(dataset.filename, kwargs)
+
+    parts = [part for part in (extra_path + filename).split("/") if part != ""]
+    if len(parts) == 0:
+        return []
+
+    paths = [dataset.fixed_path]
+    for part in parts:
+        paths = list(
+            itertools.chain.from_iterable(
+                executor.map(lambda path: list(path.glob(part)), paths)
+            )
+        )
+
+    return [str(path) for path in paths]
+
+
+def _cache_filename(dataset_name, alternative, kwargs):
+    name = dataset_name
+    if alternative is not None:
+        name += f"_{alternative}"
+    for key in sorted(kwargs):
+        name += f"_{key}-{kwargs[key]}"
+
+    return name + ".json"
+
+
+def _sort_values(values):
+    # Keys can have a mix of integer and string values (e.g. ensemble_member)
+    return sorted(values, key=lambda x: (isinstance(x, str), x))
+
+
+def _sum_counts(counts):
+    # Counts are None for files that can't be read (netCDF)
+    if None in counts:
+        return None
+    return sum(counts)
@@ -0,0 +1,431 @@
+"""Split the files of a dataset into shards of similar size to run as an array job
+
+Each shard is loaded in a separate process (e.g. one task of a SLURM array job) and
+saved to its own file. The shard outputs are then merged into a single dataset with
+the same track IDs as if all the files had been loaded together. For example
+
+    python -m jasmin_tracks.shard plan MESACLIP --nshards 20 --output manifest.json \\
+        --filter scenario=HIST --filter ensemble_member=1
+    python -m jasmin_tracks.shard run manifest.json --output-dir shards \\
+        --drop hemisphere --reduce-precision
+    python -m jasmin_tracks.shard merge MESACLIP_HIST_member01.nc shards/*.nc
+
+The files are found and split once by plan, and each run reads its files from the
+manifest. The shard index for the run step is taken from SLURM_ARRAY_TASK_ID, unless
+given with --index. The local subcommand runs all the shards as subprocesses then
+merges them, which is useful for testing away from the cluster
+"""
+
+import argparse
+import datetime
+import heapq
+import json
+import os
+import pathlib
+import subprocess
+import sys
+
+import huracanpy
+import numpy as np
+from tqdm import tqdm
+
+from . import datasets, read_track_counts, combine
+
+
+def file_weights(files, weight="bytes"):
+    """Estimate the cost of loading each file
+
+    weight="bytes" uses the file sizes and weight="records" counts the records in each
+    file from the TRACK headers (slower, but a better estimate for compressed files)
+    """
+    if weight == "bytes":
+        return [os.path.getsize(fname) for fname in files]
+    elif weight == "records":
+        weights = []
+        for fname in files:
+            _, n_records = read_track_counts(fname)
+            if n_records is None:
+                raise ValueError(
+                    f"Can't count records in {fname}. Use weight='bytes' instead"
+                )
+            weights.append(n_records)
+        return weights
+    else:
+        raise ValueError(f"Unknown weight {weight}. Must be 'bytes' or 'records'")
+
+
+def split_files(weights, nshards):
+    """Split files into nshards with balanced total weights
+
+    Files are assigned from largest to smallest to the shard with the smallest total
+    so far. Returns a list of the file indices in each shard, sorted so that each
+    shard loads its files in the same order as the full dataset
+    """
+    if nshards < 1:
+        raise ValueError(f"nshards must be at least 1, got {nshards}")
+
+    shards = [[] for n in range(nshards)]
+    totals = [(0, n) for n in range(nshards)]
+
+    order = sorted(range(len(weights)), key=lambda n: weights[n], reverse=True)
+    for n in order:
+        total, shard = heapq.heappop(totals)
+        shards[shard].append(n)
+        heapq.heappush(totals, (total + weights[n], shard))
+
+    return [sorted(shard) for shard in shards]
+
+
+def plan_shards(dataset_name, nshards, alternative=None, weight="bytes", **kwargs):
+    """Find the files in the dataset matching the keywords and split them into nshards
+
+    Returns a manifest (a dictionary that can be saved as JSON) with the list of all
+    matching files and the file indices in each shard. The manifest is made once and
+    read by each shard, so the files are only searched and weighted once and every
+    shard uses the same split, even if the files change while the shards are running
+    """
+    dataset = datasets[dataset_name]
+    if alternative is not None:
+        dataset = dataset.select_alternative(alternative)
+
+    all_files = sorted(dataset.find_files(**kwargs))
+    if len(all_files) == 0:
+        raise ValueError(f"No files found for {dataset_name} matching {kwargs}")
+    weights = file_weights(all_files, weight=weight)
+
+    return dict(
+        dataset=dataset_name,
+        alternative=alternative,
+        filters=kwargs,
+        nshards=nshards,
+        weight=weight,
+        files=all_files,
+        weights=weights,
+        shards=split_files(weights, nshards),
+    )
+
+
+def save_manifest(manifest, filename):
+    with open(filename, "w") as f:
+        json.dump(manifest, f, indent=2)
+
+
+def load_manifest(filename):
+    with open(filename) as f:
+        return json.load(f)
+
+
+def load_shard(
+    manifest,
+    index,
+    drop=None,
+    reduce_precision=False,
+    mask_value=None,
+    prefetch=0,
+    prefetch_bytes=None,
+):
+    """Load the tracks for a single shard of a manifest from plan_shards, equivalent
+    to combine.get_tracks for those files
+
+    A "file_index" variable is added so that merge_shards can reconstruct the order
+    of the full dataset. Selecting tracks by time is done by merge_shards, after the
+    track IDs are renumbered. Returns None if the shard doesn't contain any tracks
+    """
+    dataset = datasets[manifest["dataset"]]
+    if manifest["alternative"] is not None:
+        dataset = dataset.select_alternative(manifest["alternative"])
+
+    file_indices = manifest["shards"][index]
+    files = [manifest["files"][n] for n in file_indices]
+
+    all_tracks = []
+    loader = combine.prefetch_files(files, prefetch=prefetch, max_bytes=prefetch_bytes)
+    for (fname, local_copy), n in tqdm(zip(loader, file_indices), total=len(files)):
+        tracks = combine.load_file(
+            dataset, fname, exclude=manifest["filters"], local_copy=local_copy
+        )
+        if tracks is not None:
+            tracks["file_index"] = ("record", [n] * len(tracks.time))
+            all_tracks.append(tracks)
+
+    if len(all_tracks) == 0:
+        return None
+
+    return combine.combine_tracks(
+        all_tracks,
+        drop=drop,
+        reduce_precision=reduce_precision,
+        mask_value=mask_value,
+    )
+
+
+def merge_shards(filenames, start_time=None, end_time=None):
+    """Combine the outputs from load_shard into a single dataset
+
+    Records are put back in the order of the files in the full dataset and the track
+    IDs are renumbered so that they don't depend on the number of shards. Tracks are
+    then selected by start_time and end_time, as in combine.get_tracks, so the track
+    IDs are the same as loading all the files together
+    """
+    if len(filenames) == 0:
+        raise ValueError("No shard outputs to merge")
+
+    shards = [huracanpy.load(str(fname)) for fname in sorted(filenames)]
+    # Original track ID already saved as "track_id_original" by each shard
+    tracks = huracanpy.concat_tracks(shards, keep_track_id=False)
+
+    tracks = tracks.isel(record=np.argsort(tracks.file_index.values, kind="stable"))
+
+    # Records from each track are contiguous within a file, so a new track starts
+    # whenever the file or the original track ID changes
+    file_index = tracks.file_index.values
+    track_id_original = tracks.track_id_original.values
+    new_track = np.ones(len(file_index), dtype=bool)
+    new_track[1:] = (file_index[1:] != file_index[:-1]) | (
+        track_id_original[1:] != track_id_original[:-1]
+    )
+    # Keep the attributes (cf_role) needed to save the tracks
+    tracks["track_id"] = ("record", np.cumsum(new_track) - 1, tracks.track_id.attrs)
+    tracks = tracks.drop_vars("file_index")
+
+    return combine.select_time_range(tracks, start_time, end_time)
+
+
+def shard_filename(output_dir, dataset_name, nshards, index):
+    return str(
+        pathlib.Path(output_dir)
+        / f"{dataset_name}_shard{index:04d}of{nshards:04d}.nc"
+    )
+
+
+def _parse_filters(filters):
+    # Convert key=value arguments to keywords for find_files. Values are converted to
+    # integers unless that would change them (e.g. "CNTRL" or "001")
+    kwargs = dict()
+    for item in filters or []:
+        key, sep, value = item.partition("=")
+        if not sep:
+            raise ValueError(f"Filters must be given as key=value, got {item}")
+        try:
+            if str(int(value)) == value:
+                value = int(value)
+        except ValueError:
+            pass
+        kwargs[key] = value
+
+    return kwargs
+
+
+def _parse_size(size):
+    # Number of bytes from e.g. "2e9", "2G" or "500MB"
+    units = dict(K=1e3, M=1e6, G=1e9, T=1e12)
+    number = size.upper().removesuffix("B")
+    scale = 1
+    if number[-1:] in units:
+        number, scale = number[:-1], units[number[-1]]
+
+    try:
+        return int(float(number) * scale)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Invalid size {size}, e.g. 2e9 or 2G")
+
+
+def _shard_index(index):
+    if index is not None:
+        return index
+
+    try:
+        return int(os.environ["SLURM_ARRAY_TASK_ID"])
+    except KeyError:
+        raise ValueError("Give --index or set SLURM_ARRAY_TASK_ID")
+
+
+def _run_command(args, manifest_file, index):
+    # Rebuild the command for a single shard from the arguments to "local"
+    command = [sys.executable, "-m", "jasmin_tracks.shard", "run", manifest_file]
+    command += ["--index", str(index), "--output-dir", args.output_dir]
+    for var in args.drop or []:
+        command += ["--drop", var]
+    if args.reduce_precision:
+        command.append("--reduce-precision")
+    if args.mask_value is not None:
+        command += ["--mask-value", str(args.mask_value)]
+    command += ["--prefetch", str(args.prefetch)]
+    if args.prefetch_bytes is not None:
+        command += ["--prefetch-bytes", str(args.prefetch_bytes)]
+
+    return command
+
+
+def _plan_from_args(args):
+    return plan_shards(
+        args.dataset,
+        args.nshards,
+        alternative=args.alternative,
+        weight=args.weight,
+        **_parse_filters(args.filter),
+    )
+
+
+def _save_shard(manifest, index, args):
+    tracks = load_shard(
+        manifest,
+        index,
+        drop=args.drop,
+        reduce_precision=args.reduce_precision,
+        mask_value=args.mask_value,
+        prefetch=args.prefetch,
+        prefetch_bytes=args.prefetch_bytes,
+    )
+    filename = shard_filename(
+        args.output_dir, manifest["dataset"], manifest["nshards"], index
+    )
+    if tracks is None:
+        print(f"No tracks in shard {index} of {manifest['nshards']}")
+        # Don't leave the output from a previous run to be merged
+        if os.path.exists(filename):
+            os.remove(filename)
+        return
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    tracks.hrcn.save(filename)
+
+
+def _add_dataset_arguments(parser):
+    parser.add_argument("dataset", help="Name of the dataset in jasmin_tracks.datasets")
+    parser.add_argument(
+        "--filter",
+        action="append",
+        help="Subset the files with key=value, e.g. year=2000. Can be given multiple "
+        "times",
+    )
+    parser.add_argument("--alternative", default=None)
+    parser.add_argument("--nshards", type=int, required=True)
+    parser.add_argument("--weight", choices=["bytes", "records"], default="bytes")
+
+
+def _add_load_arguments(parser):
+    parser.add_argument("--output-dir", default=".")
+    parser.add_argument(
+        "--drop", action="append", help="Variable to drop. Can be given multiple times"
+    )
+    parser.add_argument("--reduce-precision", action="store_true")
+    parser.add_argument("--mask-value", type=float, default=None)
+    parser.add_argument(
+        "--prefetch", type=int, default=0, help="Number of files to read ahead"
+    )
+    parser.add_argument(
+        "--prefetch-bytes",
+        type=_parse_size,
+        default=None,
+        help="Maximum total size of files read ahead, e.g. 2e9 or 2G",
+    )
+
+
+def _add_time_arguments(parser):
+    # Applied when merging, so the track IDs match combine.get_tracks
+    parser.add_argument(
+        "--start-time",
+        type=datetime.datetime.fromisoformat,
+        default=None,
+        help="Only keep tracks starting at or after this time, e.g. 2000-01-01",
+    )
+    parser.add_argument(
+        "--end-time",
+        type=datetime.datetime.fromisoformat,
+        default=None,
+        help="Only keep tracks ending before this time",
+    )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m jasmin_tracks.shard",
+        description="Load a dataset in size-balanced shards",
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    plan = subparsers.add_parser(
+        "plan", help="Split the files into shards and save the manifest"
+    )
+    _add_dataset_arguments(plan)
+    plan.add_argument(
+        "--output", default=None, help="Filename to save the manifest (JSON)"
+    )
+
+    run = subparsers.add_parser("run", help="Load a single shard and save it")
+    run.add_argument("manifest", help="Manifest saved by plan")
+    _add_load_arguments(run)
+    run.add_argument(
+        "--index", type=int, default=None, help="Default is $SLURM_ARRAY_TASK_ID"
+    )
+
+    local = subparsers.add_parser(
+        "local", help="Run every shard as a local subprocess then merge them"
+    )
+    _add_dataset_arguments(local)
+    _add_load_arguments(local)
+    _add_time_arguments(local)
+    local.add_argument("--output", required=True, help="Filename of merged output")
+    local.add_argument("--jobs", type=int, default=1, help="Shards to run at once")
+
+    merge = subparsers.add_parser("merge", help="Merge shard outputs into one file")
+    merge.add_argument("output")
+    merge.add_argument("shards", nargs="+")
+    _add_time_arguments(merge)
+
+    args = parser.parse_args(argv)
+
+    if args.command == "plan":
+        manifest = _plan_from_args(args)
+        for n, shard in enumerate(manifest["shards"]):
+            print(
+                f"Shard {n}: {len(shard)} files, "
+                f"{sum(manifest['weights'][m] for m in shard)} {args.weight}"
+            )
+
+        if args.output is not None:
+            save_manifest(manifest, args.output)
+
+    elif args.command == "run":
+        _save_shard(load_manifest(args.manifest), _shard_index(args.index), args)
+
+    elif args.command == "local":
+        manifest = _plan_from_args(args)
+        os.makedirs(args.output_dir, exist_ok=True)
+        manifest_file = str(
+            pathlib.Path(args.output_dir) / f"{args.dataset}_manifest.json"
+        )
+        save_manifest(manifest, manifest_file)
+
+        # Run shards in batches of --jobs subprocesses
+        for start in range(0, args.nshards, args.jobs):
+            processes = [
+                subprocess.Popen(_run_command(args, manifest_file, index))
+                for index in range(start, min(start + args.jobs, args.nshards))
+            ]
+            for process in processes:
+                if process.wait() != 0:
+                    raise RuntimeError(f"Shard failed: {' '.join(process.args)}")
+
+        # Empty shards don't write any output
+        filenames = [
+            shard_filename(args.output_dir, args.dataset, args.nshards, index)
+            for index in range(args.nshards)
+        ]
+        tracks = merge_shards(
+            [f for f in filenames if os.path.exists(f)],
+            start_time=args.start_time,
+            end_time=args.end_time,
+        )
+        tracks.hrcn.save(args.output)
+
+    elif args.command == "merge":
+        tracks = merge_shards(
+            args.shards, start_time=args.start_time, end_time=args.end_time
+        )
+        tracks.hrcn.save(args.output)
+
+
+if __name__ == "__main__":
+    main()
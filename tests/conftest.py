@@ -0,0 +1,24 @@
+import shutil
+
+import huracanpy
+import pytest
+
+# File names from the ERA5 "tcident" alternative, which the huracanpy example matches
+era5_path = "ERA5/{hemisphere}/ERA5_{year}_VOR_VERTAVG_T63/"
+era5_filename = "tr_trs_{sign}.2day_addT63vor_addmslp_add925wind_add10mwind.tcident.new"
+
+
+@pytest.fixture
+def data_path(tmp_path):
+    # A copy of the huracanpy example file for each file in part of the ERA5 dataset
+    path = tmp_path / "data"
+    for hemisphere in ["NH", "SH"]:
+        for year in [2000, 2001, 2002]:
+            for sign in ["pos", "neg"]:
+                fname = path / (era5_path + era5_filename).format(
+                    hemisphere=hemisphere, year=year, sign=sign
+                )
+                fname.parent.mkdir(parents=True, exist_ok=True)
+                shutil.copy(huracanpy.example_TRACK_file, fname)
+
+    return path
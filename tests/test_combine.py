@@ -0,0 +1,71 @@
+import pathlib
+import threading
+
+import pytest
+import xarray as xr
+
+from jasmin_tracks import combine, datasets
+
+
+@pytest.fixture
+def files(tmp_path):
+    files = []
+    for n in range(7):
+        fname = tmp_path / f"file{n}"
+        fname.write_bytes(bytes([n]) * (n + 1) * 10)
+        files.append(str(fname))
+
+    return files
+
+
+@pytest.mark.parametrize("prefetch", [0, 1, 3, 10])
+@pytest.mark.parametrize("max_bytes", [None, 25, 1])
+def test_prefetch_files(files, prefetch, max_bytes):
+    result = []
+    for fname, local_copy in combine.prefetch_files(
+        files, prefetch=prefetch, max_bytes=max_bytes
+    ):
+        if prefetch == 0:
+            assert local_copy is None
+        else:
+            local_copy = pathlib.Path(local_copy)
+            assert local_copy.name == pathlib.Path(fname).name
+            assert local_copy.read_bytes() == pathlib.Path(fname).read_bytes()
+
+            # Files waiting (including the current file) stay within max_bytes
+            if max_bytes is not None:
+                copies = local_copy.parents[1].glob("*/*")
+                total = sum(copy.stat().st_size for copy in copies)
+                assert total <= max(max_bytes, pathlib.Path(fname).stat().st_size)
+        result.append(fname)
+
+    assert result == files
+
+
+def test_prefetch_files_overlap(files, monkeypatch):
+    # With prefetch=1, the next file is copied while the current file is used
+    started = {fname: threading.Event() for fname in files}
+    copyfile = combine.shutil.copyfile
+
+    def record_copyfile(fname, local_copy):
+        started[fname].set()
+        return copyfile(fname, local_copy)
+
+    monkeypatch.setattr(combine.shutil, "copyfile", record_copyfile)
+
+    for n, (fname, local_copy) in enumerate(combine.prefetch_files(files, prefetch=1)):
+        if n + 1 < len(files):
+            assert started[files[n + 1]].wait(timeout=5)
+
+
+@pytest.mark.parametrize("prefetch, prefetch_bytes", [(1, None), (2, 1e3), (10, None)])
+def test_get_tracks_prefetch(data_path, monkeypatch, prefetch, prefetch_bytes):
+    monkeypatch.setattr(datasets["ERA5"], "fixed_path", data_path / "ERA5")
+    kwargs = dict(alternative="tcident", hemisphere="NH")
+
+    tracks = combine.get_tracks(
+        "ERA5", prefetch=prefetch, prefetch_bytes=prefetch_bytes, **kwargs
+    )
+    expected = combine.get_tracks("ERA5", **kwargs)
+
+    xr.testing.assert_identical(tracks, expected)
@@ -0,0 +1,75 @@
+from concurrent.futures import ThreadPoolExecutor
+import shutil
+
+import huracanpy
+import pytest
+
+from jasmin_tracks import datasets, TrackDataset
+from jasmin_tracks.inventory import get_inventory, find_files_concurrent
+
+
+@pytest.fixture
+def dataset(tmp_path, monkeypatch):
+    path = tmp_path / "data"
+    for hemisphere in ["NH", "SH"]:
+        for year in [2000, 2001]:
+            fname = path / hemisphere / f"X_{year}" / "tr_trs_pos.new"
+            fname.parent.mkdir(parents=True)
+            shutil.copy(huracanpy.example_TRACK_file, fname)
+
+    monkeypatch.setitem(
+        datasets,
+        "test",
+        TrackDataset(path, "{hemisphere}/X_{year:04d}/", "tr_trs_{sign}.new"),
+    )
+
+    return "test"
+
+
+def test_get_inventory(dataset, tmp_path):
+    inventory = get_inventory(dataset, cache_dir=tmp_path / "cache", year=2001)
+
+    assert inventory["n_files"] == 2
+    assert inventory["values"] == dict(
+        hemisphere=["NH", "SH"], year=[2001], sign=["pos"]
+    )
+    assert "n_tracks" not in inventory and "n_records" not in inventory
+
+
+def test_get_inventory_counts(dataset, tmp_path):
+    cache_dir = tmp_path / "cache"
+    get_inventory(dataset, cache_dir=cache_dir)
+
+    # Rescans because the cached inventory has no counts, and keeps both counts
+    inventory = get_inventory(dataset, cache_dir=cache_dir, count_records=True)
+    assert inventory["n_tracks"] == 8
+    assert inventory["n_records"] == 4 * 46
+
+    # Uses the cache
+    cached = get_inventory(dataset, cache_dir=cache_dir, count_tracks=True)
+    assert cached == inventory
+
+
+@pytest.mark.parametrize(
+    "kwargs",
+    [
+        dict(),
+        # Unfiltered key in the directories
+        dict(year=2001),
+        dict(hemisphere="SH"),
+        # Unfiltered key in the filename
+        dict(hemisphere="NH", year=2000),
+        # Filter on the filename only
+        dict(sign="neg"),
+        dict(hemisphere="NH", year=2002, sign="pos"),
+        dict(year=1999),
+    ],
+)
+def test_find_files_concurrent(data_path, monkeypatch, kwargs):
+    monkeypatch.setattr(datasets["ERA5"], "fixed_path", data_path / "ERA5")
+    dataset = datasets["ERA5"].select_alternative("tcident")
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        files = find_files_concurrent(dataset, executor, **kwargs)
+
+    assert sorted(files) == sorted(dataset.find_files(**kwargs))
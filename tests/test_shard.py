@@ -0,0 +1,111 @@
+from datetime import datetime
+import os
+import pathlib
+import subprocess
+import sys
+
+import huracanpy
+import numpy as np
+import pytest
+import xarray as xr
+
+from jasmin_tracks import combine, datasets
+from jasmin_tracks.shard import plan_shards, merge_shards, split_files, _parse_size
+
+
+def run_local(data_path, output_dir, nshards, *args):
+    output = output_dir / "merged.nc"
+    subprocess.run(
+        [sys.executable, "-m", "jasmin_tracks.shard", "local", "ERA5"]
+        + ["--alternative", "tcident", "--filter", "hemisphere=NH"]
+        + ["--nshards", str(nshards), "--jobs", "2"]
+        + ["--output-dir", str(output_dir / "shards"), "--output", str(output)]
+        + list(args),
+        check=True,
+        env=dict(
+            os.environ,
+            HURACAN_PROJECT_PATH=str(data_path),
+            PYTHONPATH=str(pathlib.Path(__file__).parents[1]),
+        ),
+    )
+
+    return huracanpy.load(str(output))
+
+
+def test_local(data_path, tmp_path):
+    # Options given before and after the filters
+    tracks = run_local(
+        data_path, tmp_path / "one", 1, "--filter", "year=2001", "--drop", "sign"
+    )
+    tracks_sharded = run_local(
+        data_path, tmp_path / "three", 3, "--filter", "year=2001", "--drop", "sign"
+    )
+
+    # Two files (pos and neg) with two tracks each
+    assert len(np.unique(tracks.track_id)) == 4
+    assert "year" not in tracks and "hemisphere" not in tracks
+    assert "sign" not in tracks and "file_index" not in tracks
+
+    # Track IDs don't depend on the number of shards
+    np.testing.assert_array_equal(tracks.track_id, tracks_sharded.track_id)
+    np.testing.assert_array_equal(tracks.time, tracks_sharded.time)
+    np.testing.assert_array_equal(tracks.lon, tracks_sharded.lon)
+
+
+def test_local_prefetch(data_path, tmp_path):
+    tracks = run_local(data_path, tmp_path / "serial", 2)
+    tracks_prefetch = run_local(
+        data_path, tmp_path / "prefetch", 2, "--prefetch", "2", "--prefetch-bytes", "1K"
+    )
+
+    xr.testing.assert_identical(tracks.load(), tracks_prefetch.load())
+
+
+def test_split_files():
+    weights = [100, 1, 1, 50, 50, 3, 99]
+    shards = split_files(weights, 3)
+
+    assert sorted(sum(shards, [])) == list(range(len(weights)))
+    assert [sum(weights[n] for n in shard) for shard in shards] == [101, 102, 101]
+    # Files in each shard are in the same order as the full dataset
+    assert all(shard == sorted(shard) for shard in shards)
+
+
+@pytest.mark.parametrize(
+    "args, kwargs",
+    [
+        (["--start-time", "2022-01-20"], dict(start_time=datetime(2022, 1, 20))),
+        (["--end-time", "2022-01-20"], dict(end_time=datetime(2022, 1, 20))),
+    ],
+)
+def test_local_time_range(data_path, tmp_path, monkeypatch, args, kwargs):
+    # The example file has tracks from 2022-01-13 to 2022-01-17 and 2022-01-22 to
+    # 2022-01-29, so half of the tracks are removed
+    tracks = run_local(data_path, tmp_path, 3, "--filter", "year=2001", *args)
+
+    monkeypatch.setattr(datasets["ERA5"], "fixed_path", data_path / "ERA5")
+    expected = combine.get_tracks(
+        "ERA5", alternative="tcident", hemisphere="NH", year=2001, **kwargs
+    )
+
+    assert len(np.unique(tracks.track_id)) == 2
+    np.testing.assert_array_equal(tracks.track_id, expected.track_id)
+    np.testing.assert_array_equal(tracks.time, expected.time)
+    np.testing.assert_array_equal(tracks.lon, expected.lon)
+
+
+@pytest.mark.parametrize(
+    "size, expected",
+    [("1000", 1000), ("2e9", 2_000_000_000), ("2G", 2_000_000_000), ("500MB", 500e6)],
+)
+def test_parse_size(size, expected):
+    assert _parse_size(size) == expected
+
+
+def test_no_files(data_path, tmp_path, monkeypatch):
+    monkeypatch.setattr(datasets["ERA5"], "fixed_path", data_path / "ERA5")
+    with pytest.raises(ValueError, match="No files found"):
+        plan_shards("ERA5", 2, alternative="tcident", year=1999)
+
+    with pytest.raises(ValueError, match="No shard outputs to merge"):
+        merge_shards([])